@@ -1,6 +1,7 @@
-from .graph import run_graph_agent, resume_graph_agent
+from .graph import run_graph_agent, run_many_graph_agents, resume_graph_agent
 
 __all__ = [
     "run_graph_agent",
+    "run_many_graph_agents",
     "resume_graph_agent",
 ]
@@ -1,112 +1,156 @@
 from __future__ import annotations
 
-from typing import Any, Dict
+import asyncio
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Tuple
 
 from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, END
 
-from .schema import State, RouterAction
+from .schema import State, RouterAction, Replace
 from .tools import ToolEnv, make_tools
-from .helpers import default_job_dir, package_outputs, make_checkpointer
+from .helpers import (
+    default_job_dir, encode_artifact, package_outputs, make_checkpointer
+)
 from .llm_wrappers import RateLimitedLLM, FailoverLLM
 from .nodes import (
-    decide_action, run_shell, run_fs_read, run_fs_write,
-    finish_done, run_scaffold, record_result, maybe_interrupt
+    TOOL_DISPATCH, decide_action, run_tool, record_result, maybe_interrupt
 )
 
+__all__ = [
+    "build_graph",
+    "run_graph_agent",
+    "run_many_graph_agents",
+    "resume_graph_agent",
+]
 
-def build_graph(job_id: str, task: str):
-    job_dir = default_job_dir()
-    work_dir = job_dir / "workdir"
-    output_dir = job_dir / "output"
-    logs_dir = job_dir / "logs"
-    for d in (work_dir, output_dir, logs_dir):
-        d.mkdir(parents=True, exist_ok=True)
-
-    # Create rate-limited LLM with fallback
-    flash = RateLimitedLLM("gemini-2.5-flash", rpm=10, temperature=0.1)
-    pro = RateLimitedLLM("gemini-2.5-pro", rpm=5, temperature=0.1)
 
+# (model name, rpm, provider) for each backend, in failover order
+LLM_BACKENDS = [
+    ("gemini-2.5-flash", 10, "google"),
     # Optional: Add Groq as fallback (no rate limits typically)
-    # groq = RateLimitedLLM("llama-3.1-70b-versatile", rpm=100,
-    #                       provider="groq", temperature=0.1)
-    # model = FailoverLLM([flash, groq, pro])
+    # ("llama-3.1-70b-versatile", 100, "groq"),
+    ("gemini-2.5-pro", 5, "google"),
+]
 
-    model = FailoverLLM([flash, pro])
 
-    env = ToolEnv(job_dir=job_dir, work_dir=work_dir)
-    tools = make_tools(env)
-    structured = model.with_structured_output(RouterAction)
+def _make_llm(spec: Tuple[str, int, str]) -> RateLimitedLLM:
+    name, rpm, provider = spec
+    return RateLimitedLLM(name, rpm=rpm, provider=provider, temperature=0.1)
 
-    init_state = State(
-        messages=[
-            {"role": "system", "content": "System prompt"},
-            {"role": "user", "content": task},
-        ],
-        task=task,
-    )
 
-    # Create closures that capture tools and structured model
-    def decide_action_node(state: State) -> Dict[str, Any]:
-        return decide_action(state, structured)
+def _make_model() -> FailoverLLM:
+    # Client construction resolves credentials and sets up HTTP clients;
+    # build the backends in parallel rather than one after another
+    with ThreadPoolExecutor(max_workers=len(LLM_BACKENDS)) as pool:
+        backends = list(pool.map(_make_llm, LLM_BACKENDS))
+    return FailoverLLM(backends)
+
 
-    def run_shell_node(state: State) -> Dict[str, Any]:
-        return run_shell(state, tools)
+# Router models shared by every job running on the same event loop. Async
+# provider clients bind to the loop they first ran on, which is why the
+# sync entry points below run every job on one long-lived loop.
+_STRUCTURED_BY_LOOP: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
 
-    def run_fs_read_node(state: State) -> Dict[str, Any]:
-        return run_fs_read(state, tools)
+_AGENT_LOOP: asyncio.AbstractEventLoop | None = None
+_AGENT_LOOP_LOCK = threading.Lock()
 
-    def run_fs_write_node(state: State) -> Dict[str, Any]:
-        return run_fs_write(state, tools)
 
-    def finish_done_node(state: State) -> Dict[str, Any]:
-        return finish_done(state, tools)
+def _agent_loop() -> asyncio.AbstractEventLoop:
+    """Return the process-wide event loop jobs run on, starting it once."""
+    global _AGENT_LOOP
+    with _AGENT_LOOP_LOCK:
+        if _AGENT_LOOP is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=loop.run_forever, name="agent-loop", daemon=True
+            ).start()
+            _AGENT_LOOP = loop
+    return _AGENT_LOOP
+
+
+def _run_on_agent_loop(coro):
+    # Unlike asyncio.run, keeps the loop (and the clients bound to it)
+    # alive between jobs in the same process
+    return asyncio.run_coroutine_threadsafe(coro, _agent_loop()).result()
+
+
+def _structured_router():
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return _make_model().with_structured_output(RouterAction)
+
+    structured = _STRUCTURED_BY_LOOP.get(loop)
+    if structured is None:
+        structured = _make_model().with_structured_output(RouterAction)
+        _STRUCTURED_BY_LOOP[loop] = structured
+    return structured
+
+
+def _bind(node_fn, dep):
+    # Close over the per-job dependency (tools or structured model)
+    async def node(state: State) -> Dict[str, Any]:
+        return await node_fn(state, dep)
+
+    return node
+
+
+def build_graph(job_id: str, task: str, job_dir: Path | None = None,
+                checkpointer=None):
+    job_dir = job_dir or default_job_dir()
+    work_dir = job_dir / "workdir"
+    output_dir = job_dir / "output"
+    logs_dir = job_dir / "logs"
+    for d in (work_dir, output_dir, logs_dir):
+        d.mkdir(parents=True, exist_ok=True)
+
+    env = ToolEnv(job_dir=job_dir, work_dir=work_dir)
+    tools = make_tools(env)
+    structured = _structured_router()
 
-    def run_scaffold_node(state: State) -> Dict[str, Any]:
-        return run_scaffold(state, tools)
+    # The checkpointer keeps state per thread_id (= job_id), so a re-run of
+    # the same job must replace, not extend, the previous run's history
+    init_state: State = {
+        "messages": Replace([
+            {"role": "system", "content": "System prompt"},
+            {"role": "user", "content": task},
+        ]),
+        "actions_taken": Replace(),
+        "last_result": None,
+        "tool_result": None,
+        "pending_action": None,
+        "done": False,
+        "reason": None,
+        "task": task,
+    }
 
     # Graph wiring
     sg = StateGraph(State)
 
-    sg.add_node("decide_action", decide_action_node)
-    sg.add_node("run_shell", run_shell_node)
-    sg.add_node("run_fs_read", run_fs_read_node)
-    sg.add_node("run_fs_write", run_fs_write_node)
-    sg.add_node("finish_done", finish_done_node)
-    sg.add_node("run_scaffold", run_scaffold_node)
+    sg.add_node("decide_action", _bind(decide_action, structured))
     sg.add_node("record_result", record_result)
     sg.add_node("maybe_interrupt", maybe_interrupt)
 
-    def route(state: State):
-        action = state.pending_action
-        if action is None:
-            return "decide_action"
-        return action.tool
+    sg.add_node("run_tool", _bind(run_tool, tools))
+    sg.add_edge("run_tool", "record_result")
+    sg.add_edge("record_result", "maybe_interrupt")
 
-    sg.add_conditional_edges(
-        "decide_action",
-        route,
-        {
-            "shell": "run_shell",
-            "fs_read": "run_fs_read",
-            "fs_write": "run_fs_write",
-            "done": "finish_done",
-            "scaffold": "run_scaffold",
-        },
-    )
+    # Every tool is served by run_tool, which dispatches on the tool name
+    routes = {name: "run_tool" for name in TOOL_DISPATCH}
+    routes["decide_action"] = "decide_action"
+
+    def route(state: State):
+        action = state.get("pending_action")
+        return "decide_action" if action is None else action.tool
 
-    for tool_node in (
-        "run_shell",
-        "run_fs_read",
-        "run_fs_write",
-        "finish_done",
-        "run_scaffold",
-    ):
-        sg.add_edge(tool_node, "record_result")
-        sg.add_edge("record_result", "maybe_interrupt")
+    sg.add_conditional_edges("decide_action", route, routes)
 
     def should_end(state: State):
-        return END if state.done else None
+        return END if state.get("done") else None
 
     sg.set_entry_point("decide_action")
     sg.add_conditional_edges(
@@ -115,9 +159,6 @@ def build_graph(job_id: str, task: str):
         {END: END, None: "decide_action"},
     )
 
-    chk_path = job_dir / "state.sqlite"
-    checkpointer = make_checkpointer(chk_path)
-
     if checkpointer is not None:
         app = sg.compile(checkpointer=checkpointer)
     else:
@@ -126,28 +167,22 @@ def build_graph(job_id: str, task: str):
     return app, init_state, job_dir, work_dir, output_dir, logs_dir
 
 
-def run_graph_agent(job_id: str, task: str) -> Dict[str, Any]:
-    app, state, job_dir, work_dir, output_dir, logs_dir = build_graph(
-        job_id, task
-    )
+def _run_config(job_id: str) -> RunnableConfig:
     # Run until done (the tool ‘done’ will set done=True)
     # We cap to a reasonable number of steps using config if needed
-    config = RunnableConfig(
+    return RunnableConfig(
         recursion_limit=40,
         configurable={
             "thread_id": job_id,  # stable per run/conversation
             "checkpoint_ns": "agent",  # optional but recommended
         },
     )
-    result_state = app.invoke(state, config=config)
 
-    # Handle both dict and Pydantic State return types from LangGraph
-    if hasattr(result_state, "actions_taken"):
-        actions_list = getattr(result_state, "actions_taken", []) or []
-    elif isinstance(result_state, dict):
-        actions_list = result_state.get("actions_taken", []) or []
-    else:
-        actions_list = []
+
+def _finalize_job(job_id: str, task: str, result_state: State,
+                  job_dir: Path, work_dir: Path, output_dir: Path,
+                  logs_dir: Path, inline_artifact: bool) -> Dict[str, Any]:
+    actions_list = result_state.get("actions_taken", []) or []
 
     # Package outputs similar to previous implementation
     report_path = job_dir / "report.md"
@@ -157,14 +192,68 @@ def run_graph_agent(job_id: str, task: str) -> Dict[str, Any]:
         encoding="utf-8",
     )
 
-    filename, b64 = package_outputs(work_dir, output_dir)
-    return {
+    filename, archive_path = package_outputs(work_dir, output_dir)
+    result = {
         "success": True,
         "artifact_filename": filename,
-        "artifact_b64": b64,
+        "artifact_path": str(archive_path),
         "report_path": str(report_path),
         "logs_path": str(logs_dir),
     }
+    # Callers that ship the archive out of band (e.g. via a Modal Volume)
+    # skip the base64 copy entirely
+    if inline_artifact:
+        result["artifact_b64"] = encode_artifact(archive_path)
+    return result
+
+
+async def _arun_job(job_id: str, task: str, job_dir: Path,
+                    checkpointer, inline_artifact: bool) -> Dict[str, Any]:
+    app, state, job_dir, work_dir, output_dir, logs_dir = build_graph(
+        job_id, task, job_dir=job_dir, checkpointer=checkpointer
+    )
+    result_state = await app.ainvoke(state, config=_run_config(job_id))
+    return await asyncio.to_thread(
+        _finalize_job, job_id, task, result_state,
+        job_dir, work_dir, output_dir, logs_dir, inline_artifact,
+    )
+
+
+async def _arun_graph_agent(job_id: str, task: str,
+                            inline_artifact: bool) -> Dict[str, Any]:
+    job_dir = default_job_dir()
+    job_dir.mkdir(parents=True, exist_ok=True)
+    async with make_checkpointer(job_dir / "state.sqlite") as checkpointer:
+        return await _arun_job(
+            job_id, task, job_dir, checkpointer, inline_artifact
+        )
+
+
+async def _arun_many_graph_agents(
+    jobs: List[Tuple[str, str]], inline_artifact: bool,
+) -> List[Dict[str, Any]]:
+    root = default_job_dir()
+    root.mkdir(parents=True, exist_ok=True)
+    async with make_checkpointer(root / "state.sqlite") as checkpointer:
+        # Each job gets its own workspace so concurrent runs don't collide
+        return await asyncio.gather(*[
+            _arun_job(job_id, task, root / job_id, checkpointer,
+                      inline_artifact)
+            for job_id, task in jobs
+        ])
+
+
+def run_graph_agent(job_id: str, task: str,
+                    inline_artifact: bool = True) -> Dict[str, Any]:
+    return _run_on_agent_loop(
+        _arun_graph_agent(job_id, task, inline_artifact))
+
+
+def run_many_graph_agents(
+    jobs: Iterable[Tuple[str, str]], inline_artifact: bool = True,
+) -> List[Dict[str, Any]]:
+    return _run_on_agent_loop(
+        _arun_many_graph_agents(list(jobs), inline_artifact))
 
 
 def resume_graph_agent(run_id: str, thread_id: str) -> Dict[str, Any]:
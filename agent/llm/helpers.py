@@ -1,72 +1,193 @@
 from __future__ import annotations
 
-import base64
 import os
 from pathlib import Path
-from shutil import make_archive
 from typing import Any, Dict
-import atexit
 import contextlib
-import json
+import functools
+import pickle
 
-from langgraph.checkpoint.sqlite import SqliteSaver
+import aiosqlite
+import orjson
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
 
 
+@functools.lru_cache(maxsize=1)
 def default_job_dir() -> Path:
     if os.path.exists("/job") or os.environ.get("MODAL_ENVIRONMENT"):
         return Path("/job")
     return Path.cwd() / "test_job"
 
 
+# Upper bound, in UTF-8 bytes, of serialized tool results kept in state
+FRAGMENT_MAX_BYTES = 20000
+
+
+def _truncate_strs(d: Any, limit: int = FRAGMENT_MAX_BYTES) -> Any:
+    if isinstance(d, str):
+        if len(d) > limit:
+            return d[:limit] + f"...[+{len(d) - limit} chars truncated]"
+        return d
+    if isinstance(d, dict):
+        return {k: _truncate_strs(v, limit) for k, v in d.items()}
+    if isinstance(d, (list, tuple)):
+        return [_truncate_strs(v, limit) for v in d]
+    return d
+
+
 def safe_json_fragment(d: Dict[str, Any]) -> str:
     try:
-        return json.dumps(d, ensure_ascii=False)[:20000]
+        # Bound large fields first so huge outputs are never fully encoded
+        buf = orjson.dumps(_truncate_strs(d), option=orjson.OPT_NON_STR_KEYS)
     except Exception:
-        return str(d)[:20000]
-
-
-def package_outputs(work_dir: Path, output_dir: Path) -> tuple[str, str]:
-    app_dir: Path | None = None
-    for c in work_dir.iterdir():
-        if c.is_dir() and (c / "package.json").exists():
-            app_dir = c
-            break
+        buf = str(d).encode("utf-8", errors="replace")
+    # Cut on bytes; "ignore" drops a multi-byte character split by the cut
+    # instead of emitting a replacement char
+    return buf[:FRAGMENT_MAX_BYTES].decode("utf-8", errors="ignore")
+
+
+# Multiple of 3 so chunks encode without padding mid-stream
+_B64_CHUNK = 3 * 1024 * 1024
+
+
+# Already-compressed formats gain nothing from deflate; store them as-is
+_STORED_SUFFIXES = frozenset({
+    ".png", ".jpg", ".jpeg", ".gif", ".webp", ".avif", ".ico",
+    ".woff", ".woff2", ".zip", ".gz", ".tgz", ".br", ".zst",
+    ".mp3", ".mp4", ".webm", ".pdf",
+})
+
+
+def _zip_dir(root_dir: Path, archive_path: Path) -> Path:
+    # Only needed once per job, at packaging time
+    import zipfile
+
+    # Like shutil.make_archive, but with the fast deflate level
+    with zipfile.ZipFile(archive_path, "w", zipfile.ZIP_DEFLATED,
+                         compresslevel=1) as zf:
+        for dirpath, dirnames, filenames in os.walk(root_dir):
+            dirnames.sort()
+            rel_dir = os.path.relpath(dirpath, root_dir)
+            if rel_dir != os.curdir:
+                zf.write(dirpath, rel_dir)
+            for name in sorted(filenames):
+                path = os.path.join(dirpath, name)
+                if os.path.isfile(path):
+                    suffix = os.path.splitext(name)[1].lower()
+                    zf.write(
+                        path, os.path.relpath(path, root_dir),
+                        compress_type=(zipfile.ZIP_STORED
+                                       if suffix in _STORED_SUFFIXES
+                                       else None),
+                    )
+    return archive_path
+
+
+def encode_artifact(path: Path) -> str:
+    import mmap
+    from base64 import b64encode
+
+    parts = []
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return ""
+        # Encode straight from the page cache; memoryview slices of the
+        # mapping avoid copying each chunk into a bytes object first
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            with memoryview(mm) as view:
+                for off in range(0, size, _B64_CHUNK):
+                    chunk = view[off:off + _B64_CHUNK]
+                    parts.append(b64encode(chunk).decode("ascii"))
+                    chunk.release()
+    return "".join(parts)
+
+
+# Project dirs recorded by the scaffold tool, keyed by workdir, so
+# packaging can skip scanning the workdir
+_APP_DIR_HINTS: Dict[str, Path] = {}
+
+
+def remember_app_dir(work_dir: Path, app_dir: Path) -> None:
+    _APP_DIR_HINTS[str(work_dir)] = Path(app_dir)
+
+
+def _find_app_dir(work_dir: Path) -> Path | None:
+    hint = _APP_DIR_HINTS.pop(str(work_dir), None)
+    if hint is not None and (hint / "package.json").is_file():
+        return hint
+
+    with os.scandir(work_dir) as it:
+        for e in it:
+            if e.is_dir(follow_symlinks=False) and os.path.exists(
+                    os.path.join(e.path, "package.json")):
+                return Path(e.path)
+    return None
+
+
+def package_outputs(work_dir: Path, output_dir: Path) -> tuple[str, Path]:
+    app_dir = _find_app_dir(work_dir)
 
     if app_dir is None:
-        base = output_dir / "artifact"
-        archive_path = make_archive(str(base), "zip", root_dir=str(work_dir))
         filename = "artifact.zip"
+        archive_path = _zip_dir(work_dir, output_dir / filename)
     else:
-        base = output_dir / app_dir.name
-        archive_path = make_archive(str(base), "zip", root_dir=str(app_dir))
         filename = f"{app_dir.name}.zip"
+        archive_path = _zip_dir(app_dir, output_dir / filename)
+
+    return filename, archive_path
 
-    b64 = base64.b64encode(Path(archive_path).read_bytes()).decode("ascii")
-    return filename, b64
 
+# WAL + synchronous=NORMAL avoids an fsync per checkpoint commit; the
+# database stays consistent, only the last commits can be lost on power loss
+_SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+)
 
-_CM_CLEANUPS = []
 
+class PickleSerializer:
+    # Checkpoint blobs are written and read only by this process's jobs,
+    # so pickle is safe here and much cheaper than JSON for nested state
+    def __init__(self):
+        self._fallback = JsonPlusSerializer()
 
-def make_checkpointer(db_path: Path):
+    def dumps(self, obj: Any) -> bytes:
+        return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def loads(self, data: bytes) -> Any:
+        return pickle.loads(data)
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        return "pickle", self.dumps(obj)
+
+    def loads_typed(self, data: tuple[str, bytes]) -> Any:
+        type_, blob = data
+        if type_ == "pickle":
+            return self.loads(blob)
+        # Checkpoints written before the switch use the default serde
+        return self._fallback.loads_typed(data)
+
+
+@contextlib.asynccontextmanager
+async def make_checkpointer(db_path: Path):
+    conn = None
+    saver = None
     try:
-        cm = SqliteSaver.from_conn_string(str(db_path))
-        if hasattr(cm, "get_next_version"):
-            return cm
-        if hasattr(cm, "__enter__") and hasattr(cm, "__exit__"):
-            saver = cm.__enter__()
-
-            def _cleanup():
-                with contextlib.suppress(Exception):
-                    cm.__exit__(None, None, None)
-
-            _CM_CLEANUPS.append(_cleanup)
-            atexit.register(_cleanup)
-            return saver
+        conn = await aiosqlite.connect(str(db_path))
+        for pragma in _SQLITE_PRAGMAS:
+            with contextlib.suppress(Exception):
+                await conn.execute(pragma)
+        saver = AsyncSqliteSaver(conn, serde=PickleSerializer())
     except Exception:
-        pass
+        saver = None
 
     try:
-        return SqliteSaver(str(db_path))
-    except Exception:
-        return None
+        yield saver
+    finally:
+        if conn is not None:
+            with contextlib.suppress(Exception):
+                await conn.close()
@@ -1,8 +1,13 @@
 from __future__ import annotations
 
+import asyncio
+import logging
+import random
+import threading
 import time
 from collections import deque
-from typing import Any, Dict
+from dataclasses import dataclass
+from typing import Any, Dict, Literal
 
 try:
     from langchain_google_genai import ChatGoogleGenerativeAI
@@ -14,14 +19,40 @@ try:
 except ImportError:
     ChatGroq = None
 
+log = logging.getLogger("devagent")
+
 
 class RateLimitExceeded(Exception):
     pass
 
 
+# Provider statuses worth retrying: throttling and transient server errors
+_RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def _status_code(exc: Exception):
+    for obj in (exc, getattr(exc, "response", None)):
+        for attr in ("status_code", "code"):
+            code = getattr(obj, attr, None)
+            if isinstance(code, int):
+                return code
+    return None
+
+
+def _retry_after(exc: Exception):
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        return max(0.0, float(headers.get("Retry-After")))
+    except (TypeError, ValueError):
+        return None
+
+
 class RateLimitedLLM:
     def __init__(self, model_name: str, rpm: int, provider: str = "google",
-                 **kwargs):
+                 max_retries: int = 4, backoff_base: float = 1.0,
+                 backoff_cap: float = 30.0, **kwargs):
         if provider == "google" and ChatGoogleGenerativeAI:
             self._impl = ChatGoogleGenerativeAI(model=model_name, **kwargs)
         elif provider == "groq" and ChatGroq:
@@ -30,20 +61,82 @@ class RateLimitedLLM:
             raise ValueError(f"Provider {provider} not available")
 
         self.rpm = rpm
-        self._timestamps = deque()
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        # Holds at most `rpm` timestamps; once full, the oldest one decides
+        # whether a new request fits in the 60s window
+        self._timestamps = deque(maxlen=rpm)
+        self._lock = threading.Lock()
 
-    def invoke(self, payload: Dict[str, Any]):
-        now = time.time()
-        while self._timestamps and now - self._timestamps[0] > 60:
-            self._timestamps.popleft()
+    def _backoff_delay(self, attempt: int, exc: Exception) -> float:
+        retry_after = _retry_after(exc)
+        if retry_after is not None:
+            # Honour the server's hint, but never beyond our own cap
+            return min(self.backoff_cap, retry_after)
+        delay = min(self.backoff_cap, self.backoff_base * 2 ** attempt)
+        return delay + random.uniform(0, self.backoff_base)
+
+    def _exhausted(self, attempts: int, exc: Exception) -> RateLimitExceeded:
+        return RateLimitExceeded(
+            f"{self._impl.model} failed after {attempts} attempts: {exc}"
+        )
+
+    def _reserve(self) -> float:
+        # Claim a slot and return 0, or return seconds until one frees up.
+        # The lock only guards bookkeeping, never a sleep, so it is safe to
+        # share between threads and event loops.
+        with self._lock:
+            now = time.time()
+            ts = self._timestamps
+            if len(ts) < self.rpm or now - ts[0] > 60:
+                ts.append(now)
+                return 0.0
+            return 60 - (now - ts[0])
+
+    def _acquire(self):
+        # Wait for the oldest request to age out of the 60s window
+        # instead of failing while the bucket is full
+        wait = self._reserve()
+        while wait > 0:
+            time.sleep(wait + random.uniform(0, 0.25))
+            wait = self._reserve()
+
+    async def _aacquire(self):
+        wait = self._reserve()
+        while wait > 0:
+            await asyncio.sleep(wait + random.uniform(0, 0.25))
+            wait = self._reserve()
+
+    def _call_with_retry(self, fn, payload: Dict[str, Any]):
+        for attempt in range(self.max_retries + 1):
+            self._acquire()
+            try:
+                return fn(payload)
+            except Exception as e:
+                if _status_code(e) not in _RETRYABLE_STATUS:
+                    raise
+                if attempt == self.max_retries:
+                    raise self._exhausted(attempt + 1, e) from e
+                time.sleep(self._backoff_delay(attempt, e))
+
+    async def _acall_with_retry(self, fn, payload: Dict[str, Any]):
+        for attempt in range(self.max_retries + 1):
+            await self._aacquire()
+            try:
+                return await fn(payload)
+            except Exception as e:
+                if _status_code(e) not in _RETRYABLE_STATUS:
+                    raise
+                if attempt == self.max_retries:
+                    raise self._exhausted(attempt + 1, e) from e
+                await asyncio.sleep(self._backoff_delay(attempt, e))
 
-        if len(self._timestamps) >= self.rpm:
-            raise RateLimitExceeded(
-                f"{self._impl.model} exceeded {self.rpm} RPM"
-            )
+    def invoke(self, payload: Dict[str, Any]):
+        return self._call_with_retry(self._impl.invoke, payload)
 
-        self._timestamps.append(now)
-        return self._impl.invoke(payload)
+    async def ainvoke(self, payload: Dict[str, Any]):
+        return await self._acall_with_retry(self._impl.ainvoke, payload)
 
     def with_structured_output(self, schema):
         return StructuredRateLimitedWrapper(self, schema)
@@ -55,37 +148,113 @@ class StructuredRateLimitedWrapper:
         self.structured = rate_limited_llm._impl.with_structured_output(schema)
 
     def invoke(self, payload: Dict[str, Any]):
-        now = time.time()
-        timestamps = self.rate_limited_llm._timestamps
-        while timestamps and now - timestamps[0] > 60:
-            timestamps.popleft()
+        return self.rate_limited_llm._call_with_retry(
+            self.structured.invoke, payload
+        )
+
+    async def ainvoke(self, payload: Dict[str, Any]):
+        return await self.rate_limited_llm._acall_with_retry(
+            self.structured.ainvoke, payload
+        )
+
+
+# Circuit-breaker state for one failover backend
+@dataclass
+class BackendHealth:
+    state: Literal["closed", "open", "half_open"] = "closed"
+    opened_at: float = 0.0
+    consecutive_fail: int = 0
+    probing: bool = False
+
+    def available(self, cooldown: float) -> bool:
+        if self.state == "closed":
+            return True
+        # Open: wait out the cooldown. Probing: one request is already
+        # testing the backend, so hold the rest until it reports back; a
+        # probe that never does (e.g. cancelled) is replaced after another
+        # cooldown.
+        if (self.state == "open" or self.probing) and \
+                time.time() - self.opened_at < cooldown:
+            return False
+        self.state = "half_open"
+        self.probing = True
+        self.opened_at = time.time()
+        return True
+
+    def record_success(self) -> None:
+        self.state = "closed"
+        self.consecutive_fail = 0
+        self.probing = False
+
+    def record_failure(self, threshold: int) -> None:
+        self.consecutive_fail += 1
+        self.probing = False
+        if self.state == "half_open" or self.consecutive_fail >= threshold:
+            self.state = "open"
+            self.opened_at = time.time()
 
-        if len(timestamps) >= self.rate_limited_llm.rpm:
-            raise RateLimitExceeded(
-                f"Rate limit exceeded: {self.rate_limited_llm.rpm} RPM"
-            )
 
-        self.rate_limited_llm._timestamps.append(now)
-        return self.structured.invoke(payload)
+def _failover(pairs, payload: Dict[str, Any], threshold: int,
+              cooldown: float):
+    last_exc = None
+    for backend, health in pairs:
+        if not health.available(cooldown):
+            continue
+        try:
+            result = backend.invoke(payload)
+        except Exception as e:
+            health.record_failure(threshold)
+            last_exc = e
+            log.warning("%s, trying next backend...", e)
+            continue
+        health.record_success()
+        return result
+
+    if last_exc:
+        raise last_exc
+    raise RateLimitExceeded("All backends are unavailable (circuits open)")
+
+
+async def _afailover(pairs, payload: Dict[str, Any], threshold: int,
+                     cooldown: float):
+    last_exc = None
+    for backend, health in pairs:
+        if not health.available(cooldown):
+            continue
+        try:
+            result = await backend.ainvoke(payload)
+        except Exception as e:
+            health.record_failure(threshold)
+            last_exc = e
+            log.warning("%s, trying next backend...", e)
+            continue
+        health.record_success()
+        return result
+
+    if last_exc:
+        raise last_exc
+    raise RateLimitExceeded("All backends are unavailable (circuits open)")
 
 
 class FailoverLLM:
-    def __init__(self, backends):
+    def __init__(self, backends, failure_threshold: int = 5,
+                 cooldown: float = 30.0):
+        if not backends:
+            raise RuntimeError("No backends configured")
         self.backends = backends
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        # Shared with structured wrappers so a dead provider is skipped
+        # whichever interface hit it
+        self.health = [BackendHealth() for _ in backends]
 
     def invoke(self, payload: Dict[str, Any]):
-        last_exc = None
-        for backend in self.backends:
-            try:
-                return backend.invoke(payload)
-            except RateLimitExceeded as e:
-                last_exc = e
-                print(f"[RATE_LIMIT] {e}, trying next backend...")
-                continue
+        return _failover(zip(self.backends, self.health), payload,
+                         self.failure_threshold, self.cooldown)
 
-        if last_exc:
-            raise last_exc
-        raise RuntimeError("No backends configured")
+    async def ainvoke(self, payload: Dict[str, Any]):
+        return await _afailover(zip(self.backends, self.health), payload,
+                                self.failure_threshold, self.cooldown)
 
     def with_structured_output(self, schema):
         return StructuredFailoverWrapper(self, schema)
@@ -95,21 +264,19 @@ class StructuredFailoverWrapper:
     def __init__(self, failover_llm: FailoverLLM, schema):
         self.failover_llm = failover_llm
         self.structured_backends = []
-        for backend in failover_llm.backends:
+        for backend, health in zip(failover_llm.backends, failover_llm.health):
             if hasattr(backend, 'with_structured_output'):
                 structured_backend = backend.with_structured_output(schema)
-                self.structured_backends.append(structured_backend)
+                self.structured_backends.append((structured_backend, health))
+        if not self.structured_backends:
+            raise RuntimeError("No structured backends available")
 
     def invoke(self, payload: Dict[str, Any]):
-        last_exc = None
-        for backend in self.structured_backends:
-            try:
-                return backend.invoke(payload)
-            except RateLimitExceeded as e:
-                last_exc = e
-                print(f"[RATE_LIMIT] {e}, trying next backend...")
-                continue
-
-        if last_exc:
-            raise last_exc
-        raise RuntimeError("No structured backends available")
+        llm = self.failover_llm
+        return _failover(self.structured_backends, payload,
+                         llm.failure_threshold, llm.cooldown)
+
+    async def ainvoke(self, payload: Dict[str, Any]):
+        llm = self.failover_llm
+        return await _afailover(self.structured_backends, payload,
+                                llm.failure_threshold, llm.cooldown)
@@ -1,102 +1,81 @@
 from __future__ import annotations
 
+import asyncio
+import logging
 from typing import Any, Dict
 
+from langchain_core.prompts import ChatPromptTemplate
+
 from .helpers import safe_json_fragment
 from .schema import State
 
+log = logging.getLogger("devagent")
 
-def decide_action(state: State, structured_model) -> Dict[str, Any]:
-    print(f"[LOG] Deciding next action for task: {state.task}")
-    from langchain_core.prompts import ChatPromptTemplate
-
-    SYSTEM_TEXT = (
-        "You are a precise coding agent.\n"
-        "Return only tool selections as structured output.\n"
-        "Tools available: shell, fs_read, fs_write, scaffold, done.\n"
-        "Use 'scaffold' with recipe_id 'react-vite-js' to create "
-        "React projects.\n"
-        "Never suggest risky shell commands; keep to the job workspace.\n"
-    )
-
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", SYSTEM_TEXT),
-        ("human", "{task}"),
-    ])
-    messages = prompt.invoke({"task": state.task})
-    action = structured_model.invoke(messages)
-    print(f"[LOG] Decided action: {action}")
-    return {"pending_action": action}
-
-
-def run_shell(state: State, tools) -> Dict[str, Any]:
-    action = state.pending_action
-    assert action is not None and action.tool == "shell"
-    cmd = getattr(action.args, "command", None)
-    print(f"[LOG] Calling shell tool with command: {cmd}")
-    res = tools[0].invoke({"command": cmd})
-    print(f"[LOG] Shell tool output: {res}")
-    return {"tool_result": res}
 
+SYSTEM_TEXT = (
+    "You are a precise coding agent.\n"
+    "Return only tool selections as structured output.\n"
+    "Tools available: shell, fs_read, fs_write, scaffold, done.\n"
+    "Use 'scaffold' with recipe_id 'react-vite-js' to create "
+    "React projects.\n"
+    "Never suggest risky shell commands; keep to the job workspace.\n"
+)
 
-def run_fs_read(state: State, tools) -> Dict[str, Any]:
-    action = state.pending_action
-    assert action is not None and action.tool == "fs_read"
-    path = getattr(action.args, "path", None)
-    print(f"[LOG] Calling fs_read tool with path: {path}")
-    res = tools[1].invoke({"path": path})
-    print(f"[LOG] fs_read tool output: {res}")
-    return {"tool_result": res}
+# Built once at import; the template is identical for every step
+_DECIDE_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", SYSTEM_TEXT),
+    ("human", "{task}"),
+])
 
 
-def run_fs_write(state: State, tools) -> Dict[str, Any]:
-    action = state.pending_action
-    assert action is not None and action.tool == "fs_write"
-    path = getattr(action.args, "path", None)
-    content = getattr(action.args, "content", None)
-    print(f"[LOG] Calling fs_write tool with path: {path}")
-    res = tools[2].invoke({"path": path, "content": content})
-    print(f"[LOG] fs_write tool output: {res}")
-    return {"tool_result": res}
-
-
-def finish_done(state: State, tools) -> Dict[str, Any]:
-    action = state.pending_action
-    assert action is not None and action.tool == "done"
-    reason = getattr(action.args, "reason", None)
-    print(f"[LOG] Calling done tool with reason: {reason}")
-    res = tools[3].invoke({"reason": reason})
-    print(f"[LOG] done tool output: {res}")
-    return {"tool_result": res}
+async def decide_action(state: State, structured_model) -> Dict[str, Any]:
+    log.info("Deciding next action for task: %s", state["task"])
+    messages = _DECIDE_PROMPT.invoke({"task": state["task"]})
+    action = await structured_model.ainvoke(messages)
+    log.info("Decided action: %s", action)
+    return {"pending_action": action}
 
 
-def run_scaffold(state: State, tools) -> Dict[str, Any]:
-    action = state.pending_action
-    assert action is not None and action.tool == "scaffold"
-    recipe_id = getattr(action.args, "recipe_id", None)
-    name = getattr(action.args, "name", None)
-    print(f"[LOG] Calling scaffold tool with recipe_id: {recipe_id}, "
-          f"name: {name}")
-    res = tools[4].invoke({"recipe_id": recipe_id, "name": name})
-    print(f"[LOG] scaffold tool output: {res}")
+# Router tool name -> RouterArgs fields forwarded to that tool
+TOOL_DISPATCH = {
+    "shell": ("command",),
+    "fs_read": ("path",),
+    "fs_write": ("path", "content"),
+    "done": ("reason",),
+    "scaffold": ("recipe_id", "name"),
+}
+
+
+async def run_tool(state: State, tools) -> Dict[str, Any]:
+    action = state["pending_action"]
+    args = action.args
+    payload = {k: getattr(args, k) for k in TOOL_DISPATCH[action.tool]}
+    # Commands, paths and names go to INFO; file contents only to DEBUG
+    log.info("Calling %s tool with %s", action.tool,
+             {k: v for k, v in payload.items() if k != "content"})
+    log.debug("%s tool args: %s", action.tool, payload)
+    # Tools do blocking subprocess/file I/O; keep it off the event loop
+    res = await asyncio.to_thread(tools[action.tool].invoke, payload)
+    log.info("%s tool finished: ok=%s exit_code=%s stdout_bytes=%d",
+             action.tool, res.get("ok"), res.get("exit_code"),
+             len(res.get("stdout") or ""))
+    log.debug("%s tool output: %s", action.tool, res)
     return {"tool_result": res}
 
 
 def record_result(state: State) -> Dict[str, Any]:
-    action = state.pending_action
+    action = state.get("pending_action")
     assert action is not None
-    result = state.tool_result or {}
-    print(f"[LOG] Recording result for tool: {action.tool}")
+    result = state.get("tool_result") or {}
+    log.debug("Recording result for tool: %s", action.tool)
     action_json = safe_json_fragment(action.model_dump())
-    messages = list(state.messages)
-    messages.append({"role": "assistant", "content": action_json})
-    messages.append({
-        "role": "tool",
-        "content": safe_json_fragment(result),
-    })
+    # messages/actions_taken have append reducers; return only the delta
     new_state = {
-        "messages": messages,
-        "actions_taken": [*state.actions_taken, action_json],
+        "messages": [
+            {"role": "assistant", "content": action_json},
+            {"role": "tool", "content": safe_json_fragment(result)},
+        ],
+        "actions_taken": [action_json],
         "last_result": result,
         "pending_action": None,
         "tool_result": None,
@@ -105,11 +84,12 @@ def record_result(state: State) -> Dict[str, Any]:
     if action.tool == "done" or bool(result.get("done")):
         new_state.update({"done": True, "reason": result.get("reason")})
 
-    print(f"[LOG] New state after result: done={new_state.get('done', False)}")
+    log.debug("New state after result: done=%s",
+              new_state.get("done", False))
     return new_state
 
 
 def maybe_interrupt(state: State) -> Dict[str, Any]:
-    done = getattr(state, 'done', False)
-    print(f"[LOG] maybe_interrupt called. State done: {done}")
+    log.debug("maybe_interrupt called. State done: %s",
+              state.get("done", False))
     return {}
@@ -1,7 +1,30 @@
 from __future__ import annotations
 
-from typing import Literal, Optional, List, Dict, Any
-from pydantic import BaseModel, Field
+from typing import Annotated, Literal, Optional, List, Dict, Any, TypedDict
+from pydantic import BaseModel, ConfigDict, Field
+
+# Cap on conversation history kept in state (system + task always kept)
+MAX_MESSAGES = 16
+
+
+class Replace(list):
+    """List update that replaces an append-reduced field instead of
+    extending it (e.g. a fresh run's input on a checkpointed thread)."""
+
+
+def append_messages(
+    left: List[Dict[str, Any]], right: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    # Reducer: nodes return only new messages; keep a rolling window
+    messages = list(right) if isinstance(right, Replace) else left + right
+    if len(messages) > MAX_MESSAGES:
+        messages = messages[:2] + messages[-(MAX_MESSAGES - 2):]
+    return messages
+
+
+def append_actions(left: List[str], right: List[str]) -> List[str]:
+    # Reducer: like operator.add, but honours Replace
+    return list(right) if isinstance(right, Replace) else left + right
 
 
 class ShellArgs(BaseModel):
@@ -27,6 +50,8 @@ class ScaffoldArgs(BaseModel):
 
 
 class RouterArgs(BaseModel):
+    model_config = ConfigDict(extra="ignore", validate_assignment=False)
+
     # Use optional superset of fields to avoid JSON Schema anyOf/oneOf
     command: Optional[str] = Field(
         None, description="Shell command to execute"
@@ -43,21 +68,21 @@ class RouterArgs(BaseModel):
 
 
 class RouterAction(BaseModel):
+    model_config = ConfigDict(extra="ignore", validate_assignment=False)
+
     tool: Literal["shell", "fs_read", "fs_write", "done", "scaffold"]
     args: RouterArgs
 
 
-class State(BaseModel):
-    # Single source of truth
-    messages: List[Dict[str, Any]] = Field(default_factory=list)
-    actions_taken: List[str] = Field(default_factory=list)
-    last_result: Optional[Dict[str, Any]] = None
-    tool_result: Optional[Dict[str, Any]] = None
-    done: bool = False
-    reason: Optional[str] = None
+class State(TypedDict, total=False):
+    # Single source of truth; a plain dict so LangGraph merges node
+    # updates without re-running Pydantic validation on every transition
+    messages: Annotated[List[Dict[str, Any]], append_messages]
+    actions_taken: Annotated[List[str], append_actions]
+    last_result: Optional[Dict[str, Any]]
+    tool_result: Optional[Dict[str, Any]]
+    done: bool
+    reason: Optional[str]
     task: str
     # Transient carrier for router decision
-    pending_action: Optional[RouterAction] = None
-
-    class Config:
-        extra = "ignore"
+    pending_action: Optional[RouterAction]
@@ -1,16 +1,24 @@
 from __future__ import annotations
 
 import re
+import threading
 from typing import Any, Dict, Optional
 from pathlib import Path
 
-from langchain_core.tools import tool
+from langchain_core.tools import BaseTool, tool
 from pydantic import BaseModel, Field
 
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
 # Always import from the top-level "tools" package that lives next to "llm"
 # This works both locally (running main.py) and inside the container (/app)
 from tools import ShellTool, FsTool, ScaffoldTool  # type: ignore
 
+from .helpers import remember_app_dir
+
 
 # --- Safety: deny/allow policy for shell ---
 _DENY_PATTERNS = [
@@ -28,12 +36,59 @@ _DENY_PATTERNS = [
 ]
 
 
+# One alternation so each check is a single regex scan
+_DENY_RE = re.compile(
+    "|".join(f"(?:{pat})" for pat in _DENY_PATTERNS), re.IGNORECASE
+)
+
+
+def _compile_deny_db():
+    # Hyperscan scans with a DFA in linear time, so long or adversarial
+    # commands can't trigger regex backtracking
+    if hyperscan is None:
+        return None
+    try:
+        db = hyperscan.Database()
+        db.compile(
+            expressions=[pat.encode() for pat in _DENY_PATTERNS],
+            ids=list(range(len(_DENY_PATTERNS))),
+            elements=len(_DENY_PATTERNS),
+            flags=[hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SINGLEMATCH]
+            * len(_DENY_PATTERNS),
+        )
+        return db
+    except Exception:
+        return None
+
+
+_DENY_DB = _compile_deny_db()
+# Hyperscan scratch space must not be shared between threads
+_SCAN_LOCAL = threading.local()
+
+
+def _hs_is_risky(cmd: str) -> bool:
+    scratch = getattr(_SCAN_LOCAL, "scratch", None)
+    if scratch is None:
+        scratch = _SCAN_LOCAL.scratch = hyperscan.Scratch(_DENY_DB)
+    hits = []
+
+    def on_match(*_):
+        hits.append(True)
+        return True  # stop at the first match
+
+    try:
+        _DENY_DB.scan(cmd.encode("utf-8", errors="replace"),
+                      match_event_handler=on_match, scratch=scratch)
+    except Exception:
+        if not hits:
+            return _DENY_RE.search(cmd) is not None
+    return bool(hits)
+
+
 def is_risky_command(cmd: str) -> bool:
-    s = cmd.strip()
-    for pat in _DENY_PATTERNS:
-        if re.search(pat, s, flags=re.IGNORECASE):
-            return True
-    return False
+    if _DENY_DB is not None:
+        return _hs_is_risky(cmd)
+    return _DENY_RE.search(cmd) is not None
 
 
 class ShellInput(BaseModel):
@@ -68,7 +123,7 @@ class ToolEnv:
         self.scaffold = ScaffoldTool(self.work_dir)
 
 
-def make_tools(env: ToolEnv):
+def make_tools(env: ToolEnv) -> Dict[str, BaseTool]:
     @tool("shell", args_schema=ShellInput)
     def shell_tool(command: str) -> Dict[str, Any]:
         """Run a safe shell command in the job workdir."""
@@ -106,11 +161,19 @@ def make_tools(env: ToolEnv):
         # If scaffold succeeded, surface a completion hint so the graph can
         # finish
         if isinstance(res, dict) and res.get("ok"):
+            remember_app_dir(env.work_dir, res["project_path"])
             # Provide an explicit done flag that record_result can pass through
             res.setdefault("done", True)
+            project = res.get("project_name") or name
             res.setdefault(
-                "reason", f"Project scaffolded: {
-                    res.get('project_name') or name} ({recipe_id})", )
+                "reason", f"Project scaffolded: {project} ({recipe_id})"
+            )
         return res
 
-    return [shell_tool, fs_read_tool, fs_write_tool, done_tool, scaffold_tool]
+    return {
+        "shell": shell_tool,
+        "fs_read": fs_read_tool,
+        "fs_write": fs_write_tool,
+        "done": done_tool,
+        "scaffold": scaffold_tool,
+    }
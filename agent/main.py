@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import logging
+import os
 import sys
 from pathlib import Path
 from typing import Dict
@@ -10,13 +12,21 @@ if __name__ == "__main__":
 
 from llm import run_graph_agent
 
+logging.basicConfig(
+    level=os.environ.get("DEVAGENT_LOG", "INFO").upper(),
+    format="[%(levelname)s] %(name)s: %(message)s",
+)
 
-def run_agent_brain(job_id: str, task: str) -> Dict:
+
+def run_agent_brain(job_id: str, task: str,
+                    inline_artifact: bool = True) -> Dict:
     """Run the LangGraph-based agent for the given task.
 
-    This replaces the legacy AgentBrain implementation.
+    This replaces the legacy AgentBrain implementation. With
+    ``inline_artifact=False`` the result carries only ``artifact_path``
+    and the caller is responsible for shipping the archive.
     """
-    return run_graph_agent(job_id, task)
+    return run_graph_agent(job_id, task, inline_artifact=inline_artifact)
 
 
 if __name__ == "__main__":
@@ -1,5 +1,11 @@
-import modal
+import atexit
 import json
+import os
+import shutil
+import threading
+import time
+
+import modal
 
 
 image = modal.Image.from_dockerfile("Dockerfile")
@@ -12,6 +18,72 @@ SESSION_META = modal.Dict.from_name(
     create_if_missing=True)
 
 
+# Finished archives are published here instead of being base64-encoded into
+# the RPC response; the orchestrator reads them back by key
+ARTIFACTS = modal.Volume.from_name(
+    "glassbox-artifacts",
+    create_if_missing=True)
+ARTIFACTS_MOUNT = "/artifacts"
+# Set to "1" to return artifact_b64 inline as before
+INLINE_ARTIFACT = os.environ.get("DEVAGENT_INLINE_ARTIFACT") == "1"
+
+# Job ids whose SESSION_META entry should be removed. A background thread
+# drains them every _DELETE_INTERVAL seconds so run_job never waits on the
+# delete RPC; the orchestrator may see a stale vnc_url for that long.
+_PENDING_DELETES: set[str] = set()
+_PENDING_LOCK = threading.Lock()
+_DELETE_INTERVAL = 2.0
+_flusher: threading.Thread | None = None
+
+
+def _flush_deletes():
+    with _PENDING_LOCK:
+        batch = list(_PENDING_DELETES)
+        _PENDING_DELETES.clear()
+    for job_id in batch:
+        try:
+            del SESSION_META[job_id]
+        except Exception:
+            pass
+
+
+def _delete_loop():
+    while True:
+        time.sleep(_DELETE_INTERVAL)
+        _flush_deletes()
+
+
+def _schedule_delete(job_id: str):
+    global _flusher
+    with _PENDING_LOCK:
+        _PENDING_DELETES.add(job_id)
+        if _flusher is None:
+            _flusher = threading.Thread(
+                target=_delete_loop, name="session-meta-gc", daemon=True)
+            _flusher.start()
+
+
+# Don't leave entries behind when the container shuts down
+atexit.register(_flush_deletes)
+
+
+def _publish_artifact(job_id: str, res: dict) -> dict:
+    """Copy the archive into the artifacts volume; fall back to inline."""
+    from llm.helpers import encode_artifact
+
+    archive_path = res.get("artifact_path")
+    if not archive_path:
+        return res
+    key = f"{job_id}.zip"
+    try:
+        shutil.copyfile(archive_path, f"{ARTIFACTS_MOUNT}/{key}")
+        ARTIFACTS.commit()
+        res["artifact_key"] = key
+    except Exception:
+        res["artifact_b64"] = encode_artifact(archive_path)
+    return res
+
+
 def run_job(job_id: str, task: str) -> dict:
     """Run job and expose noVNC on :6080 while executing."""
     from main import run_agent_brain
@@ -23,13 +95,14 @@ def run_job(job_id: str, task: str) -> dict:
                 SESSION_META[job_id] = {"vnc_url": tunnel.url}
             except Exception:
                 pass
-            return run_agent_brain(job_id, task)
+            res = run_agent_brain(
+                job_id, task, inline_artifact=INLINE_ARTIFACT)
+            if INLINE_ARTIFACT:
+                return res
+            return _publish_artifact(job_id, res)
     finally:
-        # Best-effort cleanup of metadata
-        try:
-            del SESSION_META[job_id]
-        except Exception:
-            pass
+        # Best-effort cleanup of metadata, batched off the request path
+        _schedule_delete(job_id)
 
 
 # Apply Modal decorator dynamically to include port exposure
@@ -43,6 +116,7 @@ try:
         "cpu": 2,
         "memory": 4096,
         "secrets": [modal.Secret.from_name("gemini")],
+        "volumes": {ARTIFACTS_MOUNT: ARTIFACTS},
     }
     try:
         run_job = _func(ports={6080: 6080}, **_kwargs)(run_job)
@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# The agent code imports "llm" and "tools" as top-level packages, the same
+# way main.py and the container (/app) run it
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,55 @@
+from tools.fs import FsTool
+
+
+def test_batch_runs_ops_in_order(tmp_path):
+    fs = FsTool(tmp_path)
+    res = fs.batch([
+        {"op": "write", "path": "a/one.txt", "content": "1"},
+        {"op": "write", "path": "a/two.txt", "content": "22"},
+        {"op": "read", "path": "a/two.txt"},
+        {"op": "list", "path": "a"},
+    ])
+    assert [r["ok"] for r in res] == [True, True, True, True]
+    assert res[1]["bytes"] == 2
+    assert res[2]["content"] == "22"
+    assert res[3]["items"] == ["a/one.txt", "a/two.txt"]
+
+
+def test_batch_reports_malformed_ops_per_op(tmp_path):
+    fs = FsTool(tmp_path)
+    res = fs.batch([
+        {"op": "read"},
+        {"op": "write", "path": "x.txt"},
+        {"op": "write", "content": "orphan"},
+        {"op": "write"},
+        {"op": "rename", "path": "x.txt"},
+        {"path": "x.txt"},
+        ["not", "a", "dict"],
+        {"op": "write", "path": "ok.txt", "content": "fine"},
+    ])
+    assert len(res) == 8
+    assert [r["ok"] for r in res] == [False] * 7 + [True]
+    assert "missing path" in res[0]["error"]
+    assert "missing content" in res[1]["error"]
+    assert res[1]["path"] == "x.txt"
+    assert "missing path" in res[2]["error"]
+    assert "missing path, content" in res[3]["error"]
+    assert "unknown op" in res[4]["error"]
+    assert "unknown op" in res[5]["error"]
+    assert not (tmp_path / "x.txt").exists()
+    assert (tmp_path / "ok.txt").read_text() == "fine"
+
+
+def test_batch_rejects_paths_outside_root(tmp_path):
+    fs = FsTool(tmp_path / "work")
+    res = fs.batch([
+        {"op": "write", "path": "../escape.txt", "content": "x"},
+        {"op": "read", "path": "/etc/hostname"},
+    ])
+    assert [r["ok"] for r in res] == [False, False]
+    assert not (tmp_path / "escape.txt").exists()
+
+
+def test_read_translates_newlines(tmp_path):
+    (tmp_path / "crlf.txt").write_bytes(b"a\r\nb\rc\n")
+    assert FsTool(tmp_path).read("crlf.txt")["content"] == "a\nb\nc\n"
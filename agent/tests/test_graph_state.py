@@ -0,0 +1,47 @@
+from llm import graph
+from llm.schema import (
+    MAX_MESSAGES, Replace, RouterAction, RouterArgs, append_actions,
+    append_messages,
+)
+
+
+class _DoneModel:
+    """Structured router stub that finishes on the first step."""
+
+    def with_structured_output(self, schema):
+        return self
+
+    async def ainvoke(self, messages):
+        return RouterAction(tool="done", args=RouterArgs(reason="ok"))
+
+
+def test_replace_resets_append_reducers():
+    old = [{"role": "user", "content": str(i)} for i in range(5)]
+    new = [{"role": "user", "content": "new"}]
+    assert append_messages(old, Replace(new)) == new
+    assert append_messages(old, new) == old + new
+    assert append_actions(["a", "b"], Replace(["c"])) == ["c"]
+    assert append_actions(["a"], ["b"]) == ["a", "b"]
+
+
+def test_append_messages_keeps_head_and_window():
+    msgs = [{"content": i} for i in range(MAX_MESSAGES + 5)]
+    out = append_messages([], msgs)
+    assert len(out) == MAX_MESSAGES
+    assert out[:2] == msgs[:2]
+    assert out[-1] == msgs[-1]
+
+
+def test_rerun_same_thread_does_not_duplicate_history(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(graph, "_make_model", _DoneModel)
+    graph._STRUCTURED_BY_LOOP.clear()
+
+    for task in ("first task", "second task"):
+        res = graph.run_graph_agent("test-job", task, inline_artifact=False)
+
+    report = (tmp_path / "test_job" / "report.md").read_text()
+    assert "Task: second task" in report
+    # One done action from this run only, not the previous run's as well
+    assert report.count('"tool":"done"') == 1
+    assert res["success"]
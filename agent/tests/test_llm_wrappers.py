@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+
+from llm import llm_wrappers
+from llm.llm_wrappers import BackendHealth, RateLimitedLLM
+
+
+def _bare_llm(**attrs) -> RateLimitedLLM:
+    # Skip __init__: it builds a provider client, which these tests don't need
+    llm = RateLimitedLLM.__new__(RateLimitedLLM)
+    llm.backoff_base = 1.0
+    llm.backoff_cap = 30.0
+    for name, value in attrs.items():
+        setattr(llm, name, value)
+    return llm
+
+
+def _http_error(retry_after: str) -> Exception:
+    exc = Exception("429")
+    exc.response = SimpleNamespace(
+        status_code=429, headers={"Retry-After": retry_after})
+    return exc
+
+
+def test_retry_after_is_honoured_below_cap():
+    assert _bare_llm()._backoff_delay(0, _http_error("2")) == 2.0
+
+
+def test_retry_after_is_clamped_to_backoff_cap():
+    llm = _bare_llm(backoff_cap=30.0)
+    assert llm._backoff_delay(0, _http_error("3600")) == 30.0
+
+
+def test_backoff_without_retry_after_stays_under_cap():
+    llm = _bare_llm(backoff_cap=5.0)
+    for attempt in range(10):
+        assert llm._backoff_delay(attempt, Exception("500")) <= 5.0 + 1.0
+
+
+def test_half_open_admits_a_single_probe(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_wrappers.time, "time", lambda: now[0])
+    health = BackendHealth()
+    for _ in range(3):
+        health.record_failure(threshold=3)
+    assert health.state == "open"
+    assert not health.available(cooldown=10)
+
+    now[0] += 11
+    assert health.available(cooldown=10)
+    assert health.state == "half_open"
+    assert not health.available(cooldown=10)
+
+    health.record_success()
+    assert health.state == "closed"
+    assert health.available(cooldown=10)
+    assert health.available(cooldown=10)
+
+
+def test_failed_probe_reopens_circuit(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_wrappers.time, "time", lambda: now[0])
+    health = BackendHealth(state="open", opened_at=now[0])
+    now[0] += 11
+    assert health.available(cooldown=10)
+    health.record_failure(threshold=5)
+    assert health.state == "open"
+    assert not health.available(cooldown=10)
+
+
+def test_lost_probe_is_replaced_after_cooldown(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_wrappers.time, "time", lambda: now[0])
+    health = BackendHealth(state="open", opened_at=now[0])
+    now[0] += 11
+    assert health.available(cooldown=10)
+    now[0] += 11
+    assert health.available(cooldown=10)
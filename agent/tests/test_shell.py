@@ -0,0 +1,33 @@
+import os
+import signal
+import time
+
+from tools.shell import PIPE_GRACE_S, ShellTool
+
+
+def test_background_child_survives_and_exit_code_is_kept(tmp_path):
+    shell = ShellTool(tmp_path, timeout=10)
+    start = time.monotonic()
+    res = shell.run("sleep 30 & echo $!; echo started")
+    elapsed = time.monotonic() - start
+
+    pid = int(res["stdout"].split()[0])
+    try:
+        assert res["exit_code"] == 0 and res["ok"]
+        assert "started" in res["stdout"]
+        assert elapsed < PIPE_GRACE_S + 2
+        os.kill(pid, 0)  # the backgrounded child is still running
+    finally:
+        os.kill(pid, signal.SIGKILL)
+
+
+def test_timeout_keeps_captured_stderr(tmp_path):
+    res = ShellTool(tmp_path).run("echo boom >&2; sleep 30", timeout=1)
+    assert res["exit_code"] == 124 and not res["ok"]
+    assert res["stderr"] == "boom\ntimeout after 1s"
+
+
+def test_simple_command_runs_without_bash(tmp_path):
+    res = ShellTool(tmp_path).run("echo 'a b' c")
+    assert res["exit_code"] == 0
+    assert res["stdout"] == "a b c\n"
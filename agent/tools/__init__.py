@@ -3,7 +3,7 @@
 Contains simple tool wrappers the agent brain can call.
 
 Exposed tools:
-- ShellTool: run shell commands via bash -lc
+- ShellTool: run shell commands via bash -c
 - FsTool: safe read/write/list under a base directory
 - CodeExecTool: run small Python or Node snippets
 - XdotTool: minimal xdotool wrapper (optional at this stage)
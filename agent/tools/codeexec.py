@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import shutil
 import subprocess
 from pathlib import Path
 from typing import Literal
@@ -14,6 +15,10 @@ class CodeExecTool:
     def __init__(self, cwd: Path):
         self.cwd = Path(cwd)
         self.cwd.mkdir(parents=True, exist_ok=True)
+        # Resolve interpreters once so each run execs an absolute path
+        # instead of searching PATH
+        self._python = shutil.which("python3") or "python3"
+        self._node = shutil.which("node") or "node"
 
     def run(self,
             language: Literal["python",
@@ -21,9 +26,9 @@ class CodeExecTool:
             code: str,
             timeout: int = 120) -> dict:
         if language == "python":
-            cmd = ["python3", "-c", code]
+            cmd = [self._python, "-c", code]
         elif language == "node":
-            cmd = ["node", "-e", code]
+            cmd = [self._node, "-e", code]
         else:
             return {"ok": False, "error": f"unsupported language: {language}"}
         try:
@@ -1,7 +1,46 @@
 from __future__ import annotations
 
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Iterable
+from typing import Callable, Iterable, Iterator
+
+MAX_LIST_ITEMS = 2000
+LIST_WORKERS = 8
+READ_TAIL_CHARS = 12000
+_GLOB_MAGIC = re.compile(r"[*?\[]")
+# Keys each FsTool.batch op kind must carry
+_BATCH_REQUIRED: dict[str, tuple[str, ...]] = {
+    "read": ("path",),
+    "write": ("path", "content"),
+    "list": (),
+}
+
+
+def _walk(root: str) -> Iterator[os.DirEntry]:
+    """Yield every entry under `root` without following symlinked dirs."""
+    stack = [root]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    yield entry
+        except OSError:
+            continue
+
+
+def _collect(root: str, match: Callable[[str], bool]) -> list[str]:
+    """Paths of up to MAX_LIST_ITEMS matching entries under `root`."""
+    found: list[str] = []
+    for entry in _walk(root):
+        if match(entry.name):
+            found.append(entry.path)
+            if len(found) >= MAX_LIST_ITEMS:
+                break
+    return found
 
 
 class FsTool:
@@ -16,14 +55,15 @@ class FsTool:
         self.allowed_root = Path(allowed_root).resolve(
         ) if allowed_root else self.base_dir
         self.base_dir.mkdir(parents=True, exist_ok=True)
+        self._base_dir_str = str(self.base_dir)
+        self._allowed_parts = self.allowed_root.parts
 
     def _resolve(self, path: str) -> Path:
-        p = Path(path)
-        if not p.is_absolute():
-            p = (self.base_dir / p).resolve()
-        else:
-            p = p.resolve()
-        if not str(p).startswith(str(self.allowed_root)):
+        # Resolve on plain strings, following every symlink so a link in
+        # the workdir can't point the check elsewhere; then wrap once
+        p = Path(os.path.realpath(os.path.join(self._base_dir_str, path)))
+        # Component-wise compare: /work_evil is not under /work
+        if p.parts[:len(self._allowed_parts)] != self._allowed_parts:
             raise ValueError("path not allowed outside allowed_root")
         return p
 
@@ -31,20 +71,33 @@ class FsTool:
         try:
             full = self._resolve(path)
             full.parent.mkdir(parents=True, exist_ok=True)
-            full.write_text(content, encoding="utf-8")
-            return {
-                "ok": True,
-                "path": str(full),
-                "bytes": len(
-                    content.encode("utf-8"))}
+            return self._write_at(full, content)
         except Exception as e:
             return {"ok": False, "error": str(e), "path": path}
 
+    def _write_at(self, full: Path, content: str) -> dict:
+        data = content.encode("utf-8")
+        full.write_bytes(data)
+        return {"ok": True, "path": str(full), "bytes": len(data)}
+
     def read(self, path: str) -> dict:
         try:
             full = self._resolve(path)
-            text = full.read_text(encoding="utf-8")
-            return {"ok": True, "path": str(full), "content": text[-12000:]}
+            # UTF-8 is at most 4 bytes per char, so this tail always
+            # covers the last READ_TAIL_CHARS characters.
+            with open(full, "rb") as f:
+                try:
+                    f.seek(-4 * READ_TAIL_CHARS, os.SEEK_END)
+                except OSError:
+                    f.seek(0)
+                tail = f.read()
+            text = tail.decode("utf-8", errors="replace")
+            # Match read_text's universal-newline translation
+            text = text.replace("\r\n", "\n").replace("\r", "\n")
+            return {
+                "ok": True,
+                "path": str(full),
+                "content": text[-READ_TAIL_CHARS:]}
         except Exception as e:
             return {"ok": False, "error": str(e), "path": path}
 
@@ -54,13 +107,119 @@ class FsTool:
             patterns: Iterable[str] | None = None) -> dict:
         try:
             target = self._resolve(path) if path else self.base_dir
+            base = self._base_dir_str
+            pats = list(patterns) if patterns else []
+            # Literal patterns need no fnmatch: names are matched by set
+            # lookup and "dir/file" style paths are checked directly.
+            names: set[str] = set()
+            paths: list[str] = []
+            globs: list[str] = []
+            for pat in pats:
+                if _GLOB_MAGIC.search(pat):
+                    globs.append(pat)
+                elif "/" in pat or os.sep in pat:
+                    paths.append(pat)
+                else:
+                    names.add(pat)
             items = []
-            for p in sorted(target.rglob("*")):
-                if patterns:
-                    from fnmatch import fnmatch
-                    if not any(fnmatch(p.name, pat) for pat in patterns):
-                        continue
-                items.append(str(p.relative_to(self.base_dir)))
-            return {"ok": True, "base": str(target), "items": items[:2000]}
+            for pat in paths:
+                full = os.path.join(str(target), pat)
+                try:
+                    self._resolve(full)
+                except ValueError:
+                    continue
+                if os.path.lexists(full):
+                    items.append(os.path.relpath(full, base))
+            if pats and not names and not globs:
+                items.sort()
+                return {"ok": True, "base": str(target), "items": items}
+            glob_re = None
+            if globs:
+                from fnmatch import translate
+                glob_re = re.compile(
+                    "|".join(f"(?:{translate(pat)})" for pat in globs))
+
+            def match(name: str) -> bool:
+                return not pats or name in names or (
+                    glob_re is not None and glob_re.match(name) is not None)
+
+            try:
+                with os.scandir(str(target)) as it:
+                    top = list(it)
+            except OSError:
+                top = []
+            found = [e.path for e in top if match(e.name)]
+            subdirs = [e.path for e in top if e.is_dir(follow_symlinks=False)]
+            if len(subdirs) > 1:
+                # Top-level subtrees are independent; overlap their
+                # directory reads (slow on overlay/network filesystems)
+                with ThreadPoolExecutor(
+                        max_workers=min(LIST_WORKERS, len(subdirs))) as pool:
+                    for sub in pool.map(
+                            lambda d: _collect(d, match), subdirs):
+                        found.extend(sub)
+            elif subdirs:
+                found.extend(_collect(subdirs[0], match))
+            items.extend(os.path.relpath(p, base) for p in found)
+            # A literal path can also match a glob; report it once
+            items = sorted(set(items))
+            return {
+                "ok": True,
+                "base": str(target),
+                "items": items[:MAX_LIST_ITEMS]}
         except Exception as e:
             return {"ok": False, "error": str(e), "path": path or "."}
+
+    def batch(self, ops: Iterable[dict]) -> list[dict]:
+        """Run several read/write/list ops, returning one result per op.
+
+        Each op is a dict with "op" ("read", "write" or "list") plus the
+        keyword arguments of that method. Write paths are validated up
+        front and each distinct parent directory is created only once.
+        """
+        ops = list(ops)
+        results: list[dict | None] = [None] * len(ops)
+        writes: dict[int, Path] = {}
+        for i, op in enumerate(ops):
+            if not isinstance(op, dict):
+                results[i] = {"ok": False, "error": "op must be a dict"}
+                continue
+            kind = op.get("op")
+            path = op.get("path")
+            required = (
+                _BATCH_REQUIRED.get(kind) if isinstance(kind, str) else None)
+            if required is None:
+                results[i] = {
+                    "ok": False, "error": f"unknown op: {kind}", "path": path}
+                continue
+            missing = [key for key in required if op.get(key) is None]
+            if missing:
+                results[i] = {
+                    "ok": False,
+                    "error": f"{kind} op missing {', '.join(missing)}",
+                    "path": path}
+            elif kind == "write":
+                try:
+                    writes[i] = self._resolve(path)
+                except Exception as e:
+                    results[i] = {"ok": False, "error": str(e), "path": path}
+        for parent in {full.parent for full in writes.values()}:
+            try:
+                os.makedirs(parent, exist_ok=True)
+            except OSError:
+                pass  # surfaces as a failed write below
+        for i, op in enumerate(ops):
+            if results[i] is not None:
+                continue
+            kind = op["op"]
+            if kind == "write":
+                try:
+                    results[i] = self._write_at(writes[i], op["content"])
+                except Exception as e:
+                    results[i] = {
+                        "ok": False, "error": str(e), "path": op["path"]}
+            elif kind == "read":
+                results[i] = self.read(op["path"])
+            else:
+                results[i] = self.list(op.get("path"), op.get("patterns"))
+        return results
@@ -1,44 +1,67 @@
 from __future__ import annotations
 
 import json
+import logging
+import os
 import re
 from pathlib import Path
-from typing import Dict, Any, Optional
+from types import MappingProxyType
+from typing import Dict, Any, Mapping, Optional, Tuple
 
 from .shell import ShellTool
 
+log = logging.getLogger("devagent")
+
+_SANITIZE_CHARS = re.compile(r'[^a-zA-Z0-9_-]')
+_SANITIZE_DASHES = re.compile(r'-+')
+
 
 class ScaffoldTool:
     """Create project scaffolds using pre-configured recipes."""
 
+    # recipes.json is effectively static; re-parse only if its mtime moves
+    _RECIPES_CACHE: Dict[str, Tuple[float, Mapping[str, Any]]] = {}
+
     def __init__(self, cwd: Path):
         self.cwd = Path(cwd)
         self.shell = ShellTool(cwd)
         self.recipes_path = Path(__file__).parent / "../scaffold/recipes.json"
 
-    def _load_recipes(self) -> Dict[str, Any]:
-        """Load recipes from JSON file."""
+    def _load_recipes(self) -> Mapping[str, Any]:
+        """Load recipes from JSON file (read-only: the result is shared)."""
         try:
+            key = str(self.recipes_path)
+            mtime = self.recipes_path.stat().st_mtime
+            cached = ScaffoldTool._RECIPES_CACHE.get(key)
+            if cached and cached[0] == mtime:
+                return cached[1]
             with open(self.recipes_path, 'r') as f:
-                return json.load(f)
+                recipes = MappingProxyType(json.load(f))
+            ScaffoldTool._RECIPES_CACHE[key] = (mtime, recipes)
+            return recipes
         except Exception:
             return {}
 
     def _sanitize_name(self, name: str) -> str:
         """Sanitize project name to be filesystem-safe."""
         # Remove special chars, keep alphanumeric and hyphens
-        sanitized = re.sub(r'[^a-zA-Z0-9-_]', '-', name)
+        sanitized = _SANITIZE_CHARS.sub('-', name)
         # Remove multiple consecutive hyphens
-        sanitized = re.sub(r'-+', '-', sanitized)
+        sanitized = _SANITIZE_DASHES.sub('-', sanitized)
         # Remove leading/trailing hyphens
         sanitized = sanitized.strip('-')
         return sanitized.lower() or "my-app"
 
     def _resolve_name_collision(self, name: str) -> str:
         """Handle name collisions by appending numbers."""
+        try:
+            with os.scandir(self.cwd) as it:
+                existing = {e.name for e in it}
+        except FileNotFoundError:
+            return name
         base_name = name
         counter = 1
-        while (self.cwd / name).exists():
+        while name in existing:
             name = f"{base_name}-{counter}"
             counter += 1
         return name
@@ -67,8 +90,8 @@ class ScaffoldTool:
         # Resolve command template
         command = recipe["command"].format(name=name)
 
-        print(f"[SCAFFOLD] Creating {recipe_id} project: {name}")
-        print(f"[SCAFFOLD] Command: {command}")
+        log.info("Scaffolding %s project: %s", recipe_id, name)
+        log.info("Scaffold command: %s", command)
 
         # Execute the scaffold command
         result = self.shell.run(command)
@@ -1,9 +1,49 @@
 from __future__ import annotations
 
+import os
+import re
+import shlex
+import shutil
+import signal
 import subprocess
+import threading
+import time
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import IO, List, Optional
+
+# Only the tail of each stream is returned (to avoid overlong context),
+# so only the tail is kept while the command runs
+TAIL_CHARS = 8000
+_TAIL_BYTES = 4 * TAIL_CHARS
+# How long to wait for pipe EOF once the command has exited
+PIPE_GRACE_S = 1.0
+
+# Anything bash would interpret (pipes, redirects, expansion, globs,
+# quoting tricks, comments) keeps the command on the bash path
+_SHELL_META = re.compile(r"[|&;<>$`()\\*?\[\]{}~!#\n]")
+
+
+def _drain(stream: IO[bytes], buf: bytearray) -> None:
+    for chunk in iter(lambda: stream.read1(65536), b""):
+        buf += chunk
+        if len(buf) > 2 * _TAIL_BYTES:
+            del buf[:-_TAIL_BYTES]
+    stream.close()
+
+
+def _tail(buf: bytearray) -> str:
+    text = bytes(buf[-_TAIL_BYTES:]).decode("utf-8", errors="replace")
+    # Match text-mode pipes, which translated newlines
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text[-TAIL_CHARS:]
+
+
+def _join_readers(readers: List[threading.Thread], grace: float) -> None:
+    # One shared grace period, not one per reader
+    deadline = time.monotonic() + grace
+    for r in readers:
+        r.join(max(0.0, deadline - time.monotonic()))
 
 
 @dataclass
@@ -17,7 +57,9 @@ class ShellResult:
 class ShellTool:
     """Execute shell commands in a controlled way.
 
-    Uses `bash -lc` to support chaining (e.g., `cd app && npm install`).
+    Uses `bash -c` to support chaining (e.g., `cd app && npm install`);
+    plain `prog arg ...` commands are exec'd directly without a shell.
+    Pass `login=True` to get the old `bash -lc` behaviour.
     The `cwd` is constrained by the caller (typically a job workdir).
     """
 
@@ -26,53 +68,74 @@ class ShellTool:
         self.timeout = timeout
         self.cwd.mkdir(parents=True, exist_ok=True)
 
-    def run(self, command: str, timeout: Optional[int] = None) -> dict:
+    def _argv(self, command: str, login: bool) -> List[str]:
+        if login:
+            return ["bash", "-lc", command]
+        if not _SHELL_META.search(command):
+            try:
+                argv = shlex.split(command)
+            except ValueError:
+                argv = []
+            # Builtins, aliases and VAR=value prefixes still need bash
+            if argv and "=" not in argv[0] and shutil.which(argv[0]):
+                return argv
+        return ["bash", "-c", command]
+
+    def run(self, command: str, timeout: Optional[int] = None,
+            login: bool = False) -> dict:
         t = timeout or self.timeout
         try:
-            proc = subprocess.run(
-                ["bash", "-lc", command],
+            proc = subprocess.Popen(
+                self._argv(command, login),
                 cwd=str(self.cwd),
-                capture_output=True,
-                text=True,
-                timeout=t,
-                check=False,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                # Own process group, so a timeout can kill what it spawned
+                start_new_session=True,
             )
+        except FileNotFoundError as e:
             return {
-                "ok": proc.returncode == 0,
+                "ok": False,
                 "command": command,
-                "exit_code": proc.returncode,
-                # trim to avoid overlong context
-                "stdout": proc.stdout[-8000:],
-                "stderr": proc.stderr[-8000:],
+                "exit_code": 127,
+                "stdout": "",
+                "stderr": str(e),
             }
-        except subprocess.TimeoutExpired as e:
+        out, err = bytearray(), bytearray()
+        readers = [
+            threading.Thread(target=_drain, args=(stream, buf), daemon=True)
+            for stream, buf in ((proc.stdout, out), (proc.stderr, err))
+        ]
+        for r in readers:
+            r.start()
+        try:
+            exit_code = proc.wait(timeout=t)
+        except subprocess.TimeoutExpired:
+            # Only the command itself timing out kills its process group
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except OSError:
+                proc.kill()
+            proc.wait()
+            _join_readers(readers, PIPE_GRACE_S)
+            stderr = _tail(err).rstrip("\n")
             return {
                 "ok": False,
                 "command": command,
                 "exit_code": 124,
-                "stdout": (e.stdout or "")[-8000:]
-                if isinstance(e.stdout, str)
-                else "",
-                "stderr": f"timeout after {t}s",
+                "stdout": _tail(out),
+                "stderr": (f"{stderr}\n" if stderr else "")
+                + f"timeout after {t}s",
             }
+        # Backgrounded children (`npm run dev &`) keep the pipes open and
+        # must outlive this call; report what was captured so far and
+        # leave the daemon readers draining them
+        _join_readers(readers, PIPE_GRACE_S)
+        return {
+            "ok": exit_code == 0,
+            "command": command,
+            "exit_code": exit_code,
+            "stdout": _tail(out),
+            "stderr": _tail(err),
+        }
 
-
-if __name__ == "__main__":
-    from pathlib import Path
-
-    # Pick a test working directory
-    workdir = Path("/app/test_job/workdir")
-    tool = ShellTool(cwd=workdir)
-
-    # Example command — you can replace with anything
-    cmd = "npx -y create-vite@latest venkat-app --template react"
-
-    print(f"[RUNNING] {cmd}")
-    result = tool.run(cmd)
-
-    print("\n--- RESULT ---")
-    print(f"Exit code: {result['exit_code']}")
-    print("\n--- STDOUT ---")
-    print(result["stdout"])
-    print("\n--- STDERR ---")
-    print(result["stderr"])
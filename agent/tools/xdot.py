@@ -1,8 +1,14 @@
 from __future__ import annotations
 
+import re
 import subprocess
 from dataclasses import dataclass
-from typing import Literal
+from typing import Iterable, Literal, Tuple
+
+_ACTIONS = ("type", "key", "click")
+# xdotool's script reader splits on whitespace and expands $N, so only
+# single plain tokens are safe to put in a script line
+_SCRIPT_SAFE = re.compile(r"[^\s\"'$\\]+")
 
 
 @dataclass
@@ -16,19 +22,14 @@ class XdotResult:
 class XdotTool:
     """Minimal wrapper around `xdotool` for GUI automation.
 
+    `batch()` feeds consecutive actions to a single `xdotool -` script
+    run instead of forking xdotool once per action.
+
     Note: requires running inside the container with Xvfb and window manager.
     """
 
-    def run(self, action: Literal["type", "key",
-            "click"], args: str | int) -> dict:
-        if action == "type":
-            cmd = ["xdotool", "type", str(args)]
-        elif action == "key":
-            cmd = ["xdotool", "key", str(args)]
-        elif action == "click":
-            cmd = ["xdotool", "click", str(args)]
-        else:
-            return {"ok": False, "error": f"unknown action: {action}"}
+    def _exec(self, action: str, arg: str) -> dict:
+        cmd = ["xdotool", action, arg]
         proc = subprocess.run(cmd, capture_output=True, text=True)
         return {
             "ok": proc.returncode == 0,
@@ -36,3 +37,44 @@ class XdotTool:
             "exit_code": proc.returncode,
             "stderr": proc.stderr[-4000:],
         }
+
+    def _script(self, lines: list[str]) -> dict:
+        script = "".join(lines)
+        proc = subprocess.run(
+            ["xdotool", "-"], input=script, capture_output=True, text=True)
+        return {
+            "ok": proc.returncode == 0,
+            "command": script.strip(),
+            "exit_code": proc.returncode,
+            "stderr": proc.stderr[-4000:],
+        }
+
+    def run(self, action: Literal["type", "key",
+            "click"], args: str | int) -> dict:
+        if action not in _ACTIONS:
+            return {"ok": False, "error": f"unknown action: {action}"}
+        return self._exec(action, str(args))
+
+    def batch(self, actions: Iterable[Tuple[str, str | int]]) -> list[dict]:
+        """Run several actions; consecutive script-safe ones share a process.
+
+        Returns one result per xdotool run or rejected action, in order.
+        """
+        results: list[dict] = []
+        pending: list[str] = []
+        for action, args in actions:
+            if action not in _ACTIONS:
+                results.append(
+                    {"ok": False, "error": f"unknown action: {action}"})
+                continue
+            arg = str(args)
+            if _SCRIPT_SAFE.fullmatch(arg):
+                pending.append(f"{action} {arg}\n")
+                continue
+            if pending:
+                results.append(self._script(pending))
+                pending = []
+            results.append(self._exec(action, arg))
+        if pending:
+            results.append(self._script(pending))
+        return results
@@ -1,23 +1,82 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.responses import FileResponse
 from pydantic import BaseModel
+import asyncio
+import os
+import threading
 import uuid
+from pathlib import Path
 from typing import Any
 import modal
 
 app = FastAPI(title="DevAgent Orchestrator", version="0.1.0")
 
-# In-memory job store (will replace with SQLite/Redis later)
-JOBS: dict[str, dict] = {}
+# In-memory job store (will replace with SQLite/Redis later).
+# One dict per field, keyed by job id: /status polling only touches
+# STATUS and HANDLES, and most jobs never populate the other columns.
+STATUS: dict[str, str] = {}
+TASKS: dict[str, str] = {}
+HANDLES: dict[str, Any] = {}
+ERRORS: dict[str, str] = {}
+RESULTS: dict[str, Any] = {}
+DOWNLOADS: dict[str, str] = {}
+DOWNLOAD_STATS: dict[str, os.stat_result] = {}
+
+
+# Modal handles are looked up once per process; each lookup is a
+# control-plane round trip
+_MODAL_LOCK = threading.Lock()
+_RUN_FN: Any | None = None
+_SESSION_META: Any | None = None
+_ARTIFACTS_VOLUME: Any | None = None
 
 
 def _get_modal_run_fn():
     """Return the Modal function defined in the agent app."""
+    global _RUN_FN
     if modal is None:
         raise RuntimeError(
             "modal is not installed; cannot schedule remote jobs"
         )
-    return modal.Function.from_name("glassbox-agent", "run_job")
+    if _RUN_FN is None:
+        with _MODAL_LOCK:
+            if _RUN_FN is None:
+                _RUN_FN = modal.Function.from_name(
+                    "glassbox-agent", "run_job")
+    return _RUN_FN
+
+
+def _get_session_meta():
+    """Return the Modal Dict the agent publishes per-job VNC URLs to."""
+    global _SESSION_META
+    if _SESSION_META is None:
+        with _MODAL_LOCK:
+            if _SESSION_META is None:
+                _SESSION_META = modal.Dict.from_name(
+                    "glassbox-session-meta", create_if_missing=True)
+    return _SESSION_META
+
+
+def _get_artifacts_volume():
+    """Return the Modal Volume agents publish finished archives to."""
+    global _ARTIFACTS_VOLUME
+    if _ARTIFACTS_VOLUME is None:
+        with _MODAL_LOCK:
+            if _ARTIFACTS_VOLUME is None:
+                _ARTIFACTS_VOLUME = modal.Volume.from_name(
+                    "glassbox-artifacts")
+    return _ARTIFACTS_VOLUME
+
+
+@app.on_event("startup")
+def _prewarm_modal_handles():
+    try:
+        _get_modal_run_fn()
+        _get_session_meta()
+        _get_artifacts_volume()
+    except Exception as e:
+        # Not fatal: lookups are retried on first use
+        print("modal prewarm failed", e)
 
 
 class ScheduleRequest(BaseModel):
@@ -32,68 +91,163 @@ class StatusResponse(BaseModel):
     status: str
     download: str | None = None
     vnc_url: str | None = None
+    error: str | None = None
 
 
 @app.post("/schedule", response_model=ScheduleResponse)
 def schedule(req: ScheduleRequest):
     job_id = str(uuid.uuid4())
-    JOBS[job_id] = {"status": "queued", "task": req.task}
+    STATUS[job_id] = "queued"
+    TASKS[job_id] = req.task
     # Try spawning on Modal; if modal not configured, leave as queued
     try:
         run_fn = _get_modal_run_fn()
         print("run fn", run_fn)
         handle = run_fn.spawn(job_id, req.task)
         print("handle", handle)
-        JOBS[job_id]["handle"] = handle
-        JOBS[job_id]["status"] = "running"
+        HANDLES[job_id] = handle
+        STATUS[job_id] = "running"
     except Exception as e:
         # Keep queued/failed info for visibility
-        JOBS[job_id]["error"] = str(e)
+        ERRORS[job_id] = str(e)
         print("error", e)
     return {"id": job_id}
 
 
-@app.get("/status/{job_id}", response_model=StatusResponse)
-def status(job_id: str):
-    job = JOBS.get(job_id)
-    if not job:
-        raise HTTPException(status_code=404, detail="job not found")
-    handle: Any | None = job.get("handle")
-    vnc_url: str | None = None
-    # Try to fetch live VNC URL published by agent via Modal Dict
-    if modal is not None:
+ARTIFACTS_ROOT = Path("/tmp/orchestrator_artifacts")
+# Multiple of 4 so every slice of the base64 text decodes on its own
+_B64_SLICE = 4 * 16 * 1024
+
+
+def _persist_artifact(
+        job_id: str, result: Any) -> tuple[str, os.stat_result] | None:
+    """Write a finished job's archive to disk; return its path and stat."""
+    if not isinstance(result, dict):
+        return None
+    if "artifact_b64" not in result and "artifact_key" not in result:
+        return None
+    ARTIFACTS_ROOT.mkdir(parents=True, exist_ok=True)
+    out_path = ARTIFACTS_ROOT / f"{job_id}-artifact.zip"
+    with open(out_path, "wb") as f:
+        if "artifact_b64" in result:
+            # Decode slice by slice so the whole zip is never in memory
+            import binascii
+            b64: str = result["artifact_b64"]
+            for i in range(0, len(b64), _B64_SLICE):
+                f.write(binascii.a2b_base64(b64[i:i + _B64_SLICE]))
+        else:
+            # Agent published the archive to the shared volume
+            volume = _get_artifacts_volume()
+            for chunk in volume.read_file(result["artifact_key"]):
+                f.write(chunk)
+        f.flush()
+        st = os.fstat(f.fileno())
+    if "artifact_key" in result:
+        # The local copy is now the one served; free the volume entry
         try:
-            session_meta = modal.Dict.from_name(
-                "glassbox-session-meta", create_if_missing=True)
-            meta = session_meta.get(job_id)
-            if isinstance(meta, dict):
-                vnc_url = meta.get("vnc_url")
-        except Exception:
-            vnc_url = None
-    if handle and job.get("status") in {"queued", "running"}:
+            _get_artifacts_volume().remove_file(result["artifact_key"])
+        except Exception as e:
+            print("artifact cleanup failed", job_id, e)
+    return str(out_path), st
+
+
+def _vnc_url(job_id: str) -> str | None:
+    """Fetch the live VNC URL the agent publishes via Modal Dict."""
+    if modal is None:
+        return None
+    try:
+        meta = _get_session_meta().get(job_id)
+    except Exception:
+        return None
+    return meta.get("vnc_url") if isinstance(meta, dict) else None
+
+
+REAP_INTERVAL_S = 0.5
+# Persisting is retried on later passes from the stored result, then given up
+PERSIST_MAX_ATTEMPTS = 5
+_PERSIST_ATTEMPTS: dict[str, int] = {}
+
+
+def _fail_job(job_id: str, error: str) -> None:
+    ERRORS[job_id] = error
+    STATUS[job_id] = "failed"
+    print("job failed", job_id, error)
+
+
+async def _reap_job(job_id: str, handle: Any) -> None:
+    if job_id not in RESULTS:
         try:
-            # Non-blocking poll: returns immediately if not done
-            result = handle.get(timeout=0)
-            job["status"] = "complete"
-            job["result"] = result
-            # Persist artifact to a temp file and expose a simple download path
-            if isinstance(result, dict) and "artifact_b64" in result:
-                import base64
-                from pathlib import Path
-                artifacts_root = Path("/tmp/orchestrator_artifacts")
-                artifacts_root.mkdir(parents=True, exist_ok=True)
-                out_path = artifacts_root / f"{job_id}-artifact.zip"
-                data = base64.b64decode(result["artifact_b64"])  # type: ignore
-                out_path.write_bytes(data)
-                job["download_path"] = str(out_path)
-        except Exception:
-            job["status"] = "running"
+            # Non-blocking poll: raises builtin TimeoutError if not done
+            RESULTS[job_id] = await asyncio.to_thread(handle.get, timeout=0)
+        except TimeoutError:
+            return
+        except Exception as e:
+            # The remote call itself failed (or its output expired)
+            _fail_job(job_id, f"{type(e).__name__}: {e}")
+            return
+    result = RESULTS[job_id]
+    try:
+        # Persist artifact to a temp file and expose a simple download path
+        saved = await asyncio.to_thread(_persist_artifact, job_id, result)
+    except Exception as e:
+        attempts = _PERSIST_ATTEMPTS[job_id] = (
+            _PERSIST_ATTEMPTS.get(job_id, 0) + 1)
+        if attempts >= PERSIST_MAX_ATTEMPTS:
+            _PERSIST_ATTEMPTS.pop(job_id, None)
+            _fail_job(job_id, f"artifact persist failed: {e}")
+        return
+    _PERSIST_ATTEMPTS.pop(job_id, None)
+    if isinstance(result, dict) and "artifact_b64" in result:
+        # The archive now lives on disk; don't keep its base64 copy around
+        RESULTS[job_id] = {
+            k: v for k, v in result.items() if k != "artifact_b64"}
+    if saved:
+        DOWNLOADS[job_id], DOWNLOAD_STATS[job_id] = saved
+    STATUS[job_id] = "complete"
+
+
+async def _reap_jobs() -> None:
+    """Poll every in-flight Modal call, independent of /status traffic."""
+    while True:
+        pending = [
+            (job_id, HANDLES[job_id])
+            for job_id, job_status in list(STATUS.items())
+            if job_status in {"queued", "running"} and job_id in HANDLES
+        ]
+        if pending:
+            await asyncio.gather(*(_reap_job(*p) for p in pending))
+        await asyncio.sleep(REAP_INTERVAL_S)
+
+
+@app.on_event("startup")
+async def _start_reaper():
+    app.state.reaper = asyncio.create_task(_reap_jobs())
+
+
+@app.on_event("shutdown")
+async def _stop_reaper():
+    app.state.reaper.cancel()
+
+
+@app.get("/status/{job_id}", response_model=StatusResponse)
+async def status(job_id: str):
+    job_status = STATUS.get(job_id)
+    if job_status is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    # Completion is detected by _reap_jobs; only the VNC lookup is live
+    vnc_url = await asyncio.to_thread(_vnc_url, job_id)
+    job_status = STATUS[job_id]
     download = None
-    if job.get("status") == "complete" and job.get("download_path"):
+    if job_status == "complete":
         # For now we just echo the file path; a proper
         # file-serving route can be added later
-        download = job.get("download_path")
-    return {"status": job["status"], "download": download, "vnc_url": vnc_url}
+        download = DOWNLOADS.get(job_id)
+    return {
+        "status": job_status,
+        "download": download,
+        "vnc_url": vnc_url,
+        "error": ERRORS.get(job_id) if job_status == "failed" else None,
+    }
 
 
 @app.get("/download/{job_id}")
@@ -103,18 +257,19 @@ def download(job_id: str):
     Returns 404 if the job is unknown or not complete, or the artifact is missing.
     """
     # Primary: serve from in-memory job record
-    job = JOBS.get(job_id)
-    path: str | None = None
-    if job:
-        path = job.get("download_path")
+    path: str | None = DOWNLOADS.get(job_id)
+    # Stat captured at write time, so FileResponse can skip its own
+    st: os.stat_result | None = DOWNLOAD_STATS.get(job_id)
 
     # Fallback: if job record not present (e.g., server restarted),
     # try the conventional path used by the status handler.
     if not path:
-        from pathlib import Path
-        p = Path("/tmp/orchestrator_artifacts") / f"{job_id}-artifact.zip"
-        if p.exists():
+        p = ARTIFACTS_ROOT / f"{job_id}-artifact.zip"
+        try:
+            st = p.stat()
             path = str(p)
+        except OSError:
+            pass
 
     if not path:
         raise HTTPException(
@@ -124,7 +279,8 @@ def download(job_id: str):
         return FileResponse(
             path,
             media_type="application/zip",
-            filename=f"{job_id}.zip")
+            filename=f"{job_id}.zip",
+            stat_result=st)
     except Exception:
         raise HTTPException(status_code=404, detail="artifact file missing")
 